@@ -1,27 +1,26 @@
-import configparser
 from pathlib import Path
-from collections import OrderedDict
-from pprint import pprint
-from datetime import timedelta
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import subprocess
 import itertools
-import os
+import importlib
 import shutil
 import math
+import io
+import re
+import sys
 import machine as mch
-from logger import Logger
+from fast_config import fast_ini_parse, as_bool
+from utils import stat_kind, parse_walltime, copy_to_dir, format_timespan, git_check
 
-from humanfriendly import format_timespan
 import click
 
 
-SUPPORTED_CODES = {}
-try:
-    from codes.spice import Spice
-    SUPPORTED_CODES['spice'] = Spice()
-except ImportError:
-    Spice = None
-    print("Couldn't import SPICE module, you may need to install flopter.")
+# Simulation codes which can be submitted, as the module and name of the SimulationCode class implementing each. Codes
+# are only imported once selected (see get_code_class), as their dependencies can be slow to import.
+SUPPORTED_CODES = {
+    'spice': ('codes.spice', 'Spice'),
+}
 
 SUPPORTED_MACHINES = {
     'marconi': mch.marconi_skl,
@@ -29,6 +28,25 @@ SUPPORTED_MACHINES = {
     'cumulus': mch.cumulus
 }
 
+# Scheduler options used by autospice itself rather than passed on to the scheduler
+UNIVERSAL_SCHEDULER_OPTIONS = frozenset({'n_cpus', 'machine', 'user', 'isolate_first_node'})
+
+# Maximum number of job submission commands left running while the next scan points are prepared
+MAX_PENDING_SUBMISSIONS = 8
+
+# Maximum number of threads used to prepare the directories, input files and job scripts of parameter scan points
+MAX_PREPARATION_WORKERS = 8
+
+# Stands in for the value of the k-th scanning parameter in the parameter scan input file template
+SCAN_PLACEHOLDER = '__AUTOSPICE_SCAN_{}__'
+SCAN_PLACEHOLDER_RE = re.compile(r'__AUTOSPICE_SCAN_(\d+)__')
+
+# Submission parameters which differ between the points of a parameter scan, and the placeholders which stand in for
+# them in the job script header template
+SCAN_VARYING_SUBMISSION_PARAMS = ('job_name', 'out_log', 'err_log')
+HEADER_PLACEHOLDER = '__AUTOSPICE_HEADER_{}__'
+HEADER_PLACEHOLDER_RE = re.compile(r'__AUTOSPICE_HEADER_(job_name|out_log|err_log)__')
+
 
 @click.command()
 @click.argument('config_file', type=click.Path(exists=True))
@@ -40,8 +58,9 @@ SUPPORTED_MACHINES = {
 @click.option('--restart_copy_mode', '-r', default='0', type=click.Choice(['0', '1', '2', '3', 'none', 'new', 'stay_in',
                                                                            'stay_out']))
 @click.option('--param_scan_dims', '-p', default=0, type=click.INT)
+@click.option('--quiet_fl', '-q', default=False, is_flag=True)
 def submit_job(config_file, dryrun_fl=False, semi_dryrun_fl=False, safe_job_time_fl=True, backup_fl=True,
-               param_scan_dims=0, restart_copy_mode='0', log_fl=False):
+               param_scan_dims=0, restart_copy_mode='0', log_fl=False, quiet_fl=False):
     """
     Reads a YAML-like configuration file, writes a job script, and submits a
     simulation job based on the options contained in the file.
@@ -133,14 +152,20 @@ def submit_job(config_file, dryrun_fl=False, semi_dryrun_fl=False, safe_job_time
         The copying in all of these options ignores any folders within the
         original directory starting with 'backup'. Default is 1.
 
+    quiet_fl : bool
+        Boolean flag denoting whether to skip printing the values of each point
+        of a parameter scan. The values are also not printed if stdout is not a
+        terminal, e.g. when the output is redirected to a file.
+
     """
 
     # Read and parse the config file
     # TODO: Getting the autospice dir should be more rigorous
     autospice_dir = Path.cwd()
-    config_file = autospice_dir / Path(config_file)
-    config = configparser.ConfigParser()
-    config.read(config_file)
+    config_file = Path(config_file)
+    if not config_file.is_absolute():
+        config_file = autospice_dir / config_file
+    config = fast_ini_parse(config_file)
 
     scheduler_opts = config['scheduler']
     code_opts = config['code']
@@ -148,19 +173,18 @@ def submit_job(config_file, dryrun_fl=False, semi_dryrun_fl=False, safe_job_time
     # Check Initial, Universal Scheduler Options
     machine_name = scheduler_opts['machine']
     user = scheduler_opts['user']
-    if machine_name.lower() not in SUPPORTED_MACHINES:
-        raise NotImplementedError("This script assumes you're submitting a job on one of {SUPPORTED_MACHINES}")
+    machine = SUPPORTED_MACHINES.get(machine_name.lower())
+    if machine is None:
+        raise NotImplementedError(f"This script assumes you're submitting a job on one of "
+                                  f"{list(SUPPORTED_MACHINES.keys())}")
     print(f"User {user} on machine {machine_name} \n")
 
-    # Check code is supported
+    # Check code is supported and create its SimulationCode object
     code_name = code_opts['code_name']
     if code_name not in SUPPORTED_CODES:
         raise NotImplementedError("This script only supports the use of certain codes."
                                   f"Currently implemented codes are: {list(SUPPORTED_CODES.keys())}")
-
-    # Create SimulationCode object and Machine objects
-    sim_code = SUPPORTED_CODES[code_name]
-    machine = SUPPORTED_MACHINES[machine_name]
+    sim_code = get_code_class(code_name)()
 
     # Process the config file
     submission_params, call_params, n_jobs = process_scheduler_options(machine, scheduler_opts,
@@ -169,28 +193,26 @@ def submit_job(config_file, dryrun_fl=False, semi_dryrun_fl=False, safe_job_time
 
     # ---------------- Check Code Options ----------------
 
-    executable_dir = Path(code_opts['bin'])
-    input_file = Path(code_opts['input'])
-    output_dir = Path(code_opts['output'])
+    # The input, output and executable paths are all relative to the bin location, which is itself relative to the
+    # directory autospice was called from
+    executable_dir = autospice_dir / code_opts['bin']
+    input_file = executable_dir / code_opts['input']
+    output_dir = executable_dir / code_opts['output']
 
-    # Change directory to bin location
-    print(f"Changing directory to {executable_dir} \n")
-    if executable_dir.resolve().is_dir():
-        os.chdir(executable_dir)
-    else:
+    if stat_kind(executable_dir) != 'dir':
         raise ValueError('The "bin" variable must be a valid directory with a binary in it.\n'
                          f'{executable_dir}')
 
     # Check input file exists
-    if not input_file.is_file():
+    if stat_kind(input_file) != 'file':
         raise FileNotFoundError(f"No input file found at {input_file}")
 
     sim_code.verify_input_file(input_file, call_params)
     param_scan_fl = sim_code.is_parameter_scan(input_file)
 
     # Check executable file exists
-    executable = Path(code_opts['executable'])
-    if not executable.is_file() and not dryrun_fl and not semi_dryrun_fl:
+    executable = executable_dir / code_opts['executable']
+    if not dryrun_fl and not semi_dryrun_fl and stat_kind(executable) != 'file':
         raise FileNotFoundError(f"No executable file found at {executable}")
 
     copy_exe_fl = code_opts['copy_exe'] if 'copy_exe' in code_opts else False
@@ -209,7 +231,15 @@ def submit_job(config_file, dryrun_fl=False, semi_dryrun_fl=False, safe_job_time
         #  (maybe another section in the yaml file) to do this properly. Another 'would be nice' feature is collecting
         #  certain same-length parameter scans into a single dimension - which could similarly be done using more
         #  specific user input.
-        lengths = set([sp['length'] for sp in scan_params])
+        # Gather each scanned parameter's values and scan length in a single pass. Each distinct scan length is
+        # numbered in the order it's first seen, so that the dimensions of a scan are ordered deterministically.
+        all_sp_vals, all_sp_lens = [], []
+        dim_indices = {}
+        for sp in scan_params:
+            all_sp_vals.append(sp['values'])
+            all_sp_lens.append(sp['length'])
+            dim_indices.setdefault(sp['length'], len(dim_indices))
+        lengths = list(dim_indices)
         if len(lengths) != param_scan_dims and len(scan_params) != param_scan_dims:
             raise ValueError(
                 f'Cannot perform {param_scan_dims}d parameter scan; "param_scan_dims" should be set to the number of '
@@ -217,187 +247,217 @@ def submit_job(config_file, dryrun_fl=False, semi_dryrun_fl=False, safe_job_time
                 f'({len(lengths)}). \n'
                 f'Mixed multi-dimensional scanning is not yet supported.')
 
+        # Each scan point's folder is labelled by the values of the parameters at label_indices, the labels are only
+        # made as the points are prepared rather than all being held in a second list
         if len(scan_params) == 1:
-            arranged_sp_vals = [tuple([value], ) for value in scan_params[0]['values']]
-            arranged_sp_labels = [f"{scan_params[0]['parameter']}_{param_values[0]}"
-                                  for param_values in arranged_sp_vals]
+            arranged_sp_vals = [(value, ) for value in scan_params[0]['values']]
+            label_indices = [0]
         else:
-            all_sp_vals = [sp['values'] for sp in scan_params]
             if param_scan_dims == 1:
                 arranged_sp_vals = list(zip(*all_sp_vals))
-                arranged_sp_labels = [f"{scan_params[0]['parameter']}_{param_values[0]}"
-                                      for param_values in arranged_sp_vals]
+                label_indices = [0]
             elif len(lengths) == param_scan_dims:
-                dim_indices = {length: j for j, length in enumerate(lengths)}
-                all_sp_lens = [sp['length'] for sp in scan_params]
-                all_sp_len_dims = [dim_indices[l] for l in all_sp_lens]
+                # Group the parameters into a dimension for each scan length
+                dim_index_map = [[] for _ in lengths]
+                all_sp_len_dims = []
+                for i, l in enumerate(all_sp_lens):
+                    all_sp_len_dims.append(dim_indices[l])
+                    dim_index_map[dim_indices[l]].append(i)
 
-                dim_permutations = list(itertools.product(*[range(length) for length in lengths]))
+                dim_permutations = itertools.product(*map(range, lengths))
                 arranged_sp_vals = [tuple(all_sp_vals[i][perm[d]] for i, d in enumerate(all_sp_len_dims)) for perm in
                                     dim_permutations]
 
-                dim_index_map = [[] for _ in lengths]
-                for i, l in enumerate(all_sp_lens):
-                    dim_index_map[dim_indices[l]].append(i)
-                arranged_sp_labels = ['__'.join([f"{sp['parameter']}_{param_values[k]}"
-                                                 for k, sp in enumerate(scan_params)
-                                                 if k in [inds[0] for inds in dim_index_map]])
-                                      for param_values in arranged_sp_vals]
+                first_dim_indices = frozenset(inds[0] for inds in dim_index_map)
+                label_indices = [k for k in range(len(scan_params)) if k in first_dim_indices]
             else:
                 arranged_sp_vals = list(itertools.product(*all_sp_vals))
-                arranged_sp_labels = ['__'.join([f"{sp['parameter']}_{param_values[k]}"
-                                                 for k, sp in enumerate(scan_params)])
-                                      for param_values in arranged_sp_vals]
+                label_indices = range(len(scan_params))
 
-        assert len(arranged_sp_vals) == len(arranged_sp_labels)
+        label_params = [(k, scan_params[k]['parameter']) for k in label_indices]
 
-        sp_names = [f"\'{sp['section']}.{sp['parameter']}\'({sp['length']})" for sp in scan_params]
-        formatted_names = ", ".join(sp_names)
+        # Serialise the input file once, each scan point then only substitutes its own parameter values
+        input_template = get_input_template(inp_parser, scan_params)
+
+        formatted_names = ", ".join(f"'{sp['section']}.{sp['parameter']}'({sp['length']})" for sp in scan_params)
         n_scans = len(arranged_sp_vals)
         digits = int(math.log10(n_scans)) + 1
 
         print(f"Submitting a {param_scan_dims}d parameter scan! \n"
-              f"Scanning over parameter(s) {formatted_names} \n"
-              f"with the following values (N={n_scans}): \n")
-        print_slc = slice(None, None)
-        if n_scans > 100:
-            print_slc = slice(0, 20)
-
-        for i, value in enumerate(arranged_sp_vals[print_slc]):
-            print(f'{str(i + 1).zfill(digits)}) \t{", ".join([v for v in value])}')
-
-        if n_scans > 100:
-            print('\n\t· \n\t· \n\t· \n')
-            for i, value in enumerate(arranged_sp_vals[-5:]):
-                print(f'{str(n_scans - 4 + i).zfill(digits)}) \t{", ".join([v for v in value])}')
-        print('\n')
+              f"Scanning over parameter(s) {formatted_names} (N={n_scans})")
+        # Write out the preview in one go, abbreviated to the first 20 and last 5 points for large scans. It is only
+        # formatted if someone is there to read it.
+        if not quiet_fl and sys.stdout.isatty():
+            if n_scans > 100:
+                preview_points = [*enumerate(arranged_sp_vals[:20], start=1), None,
+                                  *enumerate(arranged_sp_vals[-5:], start=n_scans - 4)]
+            else:
+                preview_points = enumerate(arranged_sp_vals, start=1)
+            preview_lines = [f'{point[0]:0{digits}d}) \t{", ".join(point[1])}' if point is not None
+                             else '\n\t· \n\t· \n\t· \n' for point in preview_points]
+            sys.stdout.write('with the following values: \n\n' + '\n'.join(preview_lines) + '\n\n\n')
+        else:
+            print()
     else:
-        arranged_sp_vals = [None]
-        arranged_sp_labels = [None]
-        scan_params = [None]
-        inp_parser = None
+        input_template = None
 
     restart_fl = sim_code.is_restart(code_specific_opts)
     sim_code.directory_io(output_dir, code_specific_opts, dryrun_fl=True, restart_copy_mode=restart_copy_mode,
                           print_fl=True)
 
-    call_params.update({
-        'executable': executable,
-        'executable_dir': executable_dir,
-        'output_dir': output_dir,
-        'input_file': input_file,
-        'config_opts': code_specific_opts
-    })
-    submission_params.update({
-        'out_log': output_dir / f'{sim_code.LOG_PREFIX}.out',
-        'err_log': output_dir / f'{sim_code.LOG_PREFIX}.err',
-    })
+    call_params['executable'] = executable
+    call_params['executable_dir'] = executable_dir
+    call_params['output_dir'] = output_dir
+    call_params['input_file'] = input_file
+    call_params['config_opts'] = code_specific_opts
+    out_log_name = f'{sim_code.LOG_PREFIX}.out'
+    err_log_name = f'{sim_code.LOG_PREFIX}.err'
+    submission_params['out_log'] = output_dir / out_log_name
+    submission_params['err_log'] = output_dir / err_log_name
 
     print_choices(submission_params, call_params, code_name, machine_name)
     sim_code.print_config_options(code_specific_opts)
 
-    # TODO: This has been temporarily removed as the syntax has changed from Tom's example script.
-    # git_check(executable)
+    git_check(executable)
 
     output_dir_base = output_dir
     job_name_base = submission_params['job_name']
+    single_dim_scan_fl = param_scan_dims == 1
+    modules = machine.get_submission_script_modules()
+
+    def write_job_scripts(job_submission_params, job_call_params, header=None):
+        # The first and multi-submission job scripts only differ in their body, so share one header between them
+        if header is None:
+            header = machine.scheduler.get_submission_script_header(dict(job_submission_params))
+
+        job_script = write_job_script(job_submission_params, machine, sim_code, job_call_params, label='_0',
+                                      dryrun_fl=dryrun_fl, safe_job_time_fl=safe_job_time_fl, backup_fl=backup_fl,
+                                      modules=modules, header=header)
+
+        # The multi-submission job script is only needed if the walltime has been split over several jobs
+        job_script_multisubmission = None
+        if n_jobs > 1:
+            job_script_multisubmission = write_job_script(job_submission_params, machine, sim_code, job_call_params,
+                                                          label='_1', multi_submission=True,
+                                                          safe_job_time_fl=safe_job_time_fl, dryrun_fl=dryrun_fl,
+                                                          backup_fl=backup_fl, modules=modules, header=header)
+        return (job_script, job_script_multisubmission, job_call_params['output_dir'],
+                job_submission_params['job_name'], job_call_params['input_file'])
+
+    def prepare_scan_point(param_values):
+        # Run output directory IO in the parameter-specific folder and write its input file and job scripts. Each
+        # scan point gets its own copies of the parameter dicts so that points can be prepared concurrently.
+        param_dir = '__'.join(f"{parameter}_{param_values[k]}" for k, parameter in label_params)
+        point_output_dir = output_dir_base / param_dir
+        if not restart_fl:
+            sim_code.directory_io(point_output_dir, code_specific_opts, dryrun_fl=dryrun_fl, print_fl=False,
+                                  restart_copy_mode=restart_copy_mode)
+
+        point_input_file = point_output_dir / 'input.inp'
+        if not dryrun_fl:
+            point_input_file.write_text(fill_input_template(input_template, param_values))
+
+        point_submission_params = {
+            **submission_params,
+            'job_name': f'{job_name_base}_{param_values[0] if single_dim_scan_fl else param_dir}',
+            'out_log': point_output_dir / out_log_name,
+            'err_log': point_output_dir / err_log_name,
+        }
+        point_call_params = {
+            **call_params,
+            'output_dir': point_output_dir,
+            'input_file': point_input_file,
+        }
+        if copy_exe_fl:
+            point_call_params = sim_code.copy_executable(point_output_dir, point_call_params, dryrun_fl)
+
+        header = fill_header_template(header_template, point_submission_params)
+        return write_job_scripts(point_submission_params, point_call_params, header=header)
 
     if click.confirm('\nDo you want to continue?', default=True):
-        # Start parameter scan
-        for j, param_values in enumerate(arranged_sp_vals):
-            if param_values is None:
-                # If there are no parameters to scan then do output directory IO (creation and, if restart, backup)
-                # in the requested directory
-                output_dir = sim_code.directory_io(output_dir, code_specific_opts, dryrun_fl, print_fl=False,
-                                                   restart_copy_mode=restart_copy_mode)
-                if not dryrun_fl:
-                    shutil.copy(input_file, output_dir)
-                    shutil.copy(config_file, output_dir)
-
-                call_params['output_dir'] = output_dir
-                if copy_exe_fl:
-                    call_params = sim_code.copy_executable(output_dir, call_params, dryrun_fl)
-            else:
-                # If there are parameters to scan then run output directory IO in each parameter-specific folder.
-                if j == 0:
-                    if not restart_fl:
-                        output_dir_base = sim_code.directory_io(output_dir, code_specific_opts, dryrun_fl,
-                                                                restart_copy_mode=restart_copy_mode, print_fl=False)
-                    if not dryrun_fl:
-                        shutil.copy(input_file, output_dir_base)
-                        shutil.copy(config_file, output_dir_base)
-
-                param_dir = arranged_sp_labels[j]
-                output_dir = output_dir_base / param_dir
-
-                if not restart_fl:
-                    sim_code.directory_io(output_dir, code_specific_opts, dryrun_fl=dryrun_fl, print_fl=False,
-                                          restart_copy_mode=restart_copy_mode)
-
-                input_file = output_dir / 'input.inp'
-                for k, scan_param in enumerate(scan_params):
-                    inp_parser[scan_param['section']][scan_param['parameter']] = param_values[k]
-                if not dryrun_fl:
-                    with open(input_file, 'w') as f:
-                        inp_parser.write(f)
-
-                if param_scan_dims == 1:
-                    submission_params['job_name'] = f'{job_name_base}_{param_values[0]}'
+        if param_scan_fl:
+            # If there are parameters to scan then set up the base output directory once, every scan point is then
+            # put in its own folder within it.
+            if not restart_fl:
+                output_dir_base = sim_code.directory_io(output_dir, code_specific_opts, dryrun_fl,
+                                                        restart_copy_mode=restart_copy_mode, print_fl=False)
+            if not dryrun_fl:
+                copy_to_dir(input_file, output_dir_base)
+                copy_to_dir(config_file, output_dir_base)
+
+            # Only the job name and log files in the job script header change between scan points
+            header_template = get_header_template(machine, submission_params)
+
+            # The scan points don't depend on each other, so their (I/O bound) preparation is spread over a thread
+            # pool. The prepared points are yielded in order, so submission can start as soon as the first is ready.
+            executor = ThreadPoolExecutor(max_workers=min(MAX_PREPARATION_WORKERS, n_scans))
+            prepared_futures = [executor.submit(prepare_scan_point, param_values) for param_values in arranged_sp_vals]
+            prepared_jobs = (prepared_future.result() for prepared_future in prepared_futures)
+        else:
+            # If there are no parameters to scan then do output directory IO (creation and, if restart, backup) in
+            # the requested directory
+            executor = None
+            prepared_futures = []
+            output_dir = sim_code.directory_io(output_dir, code_specific_opts, dryrun_fl, print_fl=False,
+                                               restart_copy_mode=restart_copy_mode)
+            if not dryrun_fl:
+                copy_to_dir(input_file, output_dir)
+                copy_to_dir(config_file, output_dir)
+
+            call_params['output_dir'] = output_dir
+            if copy_exe_fl:
+                call_params = sim_code.copy_executable(output_dir, call_params, dryrun_fl)
+            prepared_jobs = [write_job_scripts(submission_params, call_params)]
+
+        pending_submissions = deque()
+        submitted_jobs = []
+        failed_submissions = []
+        try:
+            for job_script, job_script_multisubmission, output_dir, job_name, input_file in prepared_jobs:
+                # Submit job script
+                if dryrun_fl:
+                    print(f"Job script written as: \n"
+                          f"{job_script}\n")
+                elif semi_dryrun_fl:
+                    print(f"Job script written to {output_dir}.")
                 else:
-                    submission_params['job_name'] = f'{job_name_base}_{param_dir}'
-                submission_params['out_log'] = output_dir / f'{sim_code.LOG_PREFIX}.out'
-                submission_params['err_log'] = output_dir / f'{sim_code.LOG_PREFIX}.err'
-
-                call_params['output_dir'] = output_dir
-                call_params['input_file'] = input_file
-                if copy_exe_fl:
-                    call_params = sim_code.copy_executable(output_dir, call_params, dryrun_fl)
-
-            job_script = write_job_script(submission_params, machine, sim_code, call_params, label='_0',
-                                          dryrun_fl=dryrun_fl, safe_job_time_fl=safe_job_time_fl, backup_fl=backup_fl)
-
-            job_script_multisubmission = write_job_script(submission_params, machine, sim_code, call_params, label='_1',
-                                                          multi_submission=True, safe_job_time_fl=safe_job_time_fl,
-                                                          dryrun_fl=dryrun_fl, backup_fl=backup_fl)
-
-            # Submit job script
-            if dryrun_fl:
-                print(f"Job script written as: \n"
-                      f"{job_script}\n")
-            elif semi_dryrun_fl:
-                print(f"Job script written to {output_dir}.")
-            else:
-                out = subprocess.check_output([machine.scheduler.submission_command, str(job_script)])
-                *rest, job_num = str(out, 'utf-8').split(' ')
-                job_num = job_num.strip()
-                print(f"\nSubmitted job number {job_num}")
-
-                jobs = [job_num, ]
-                if n_jobs > 1:
-                    for i in range(n_jobs - 1):
-                        # TODO: (2019-10-10) This is only applicable to slurm, other implementations possible but this
-                        # TODO: is only currently necessary because of marconi's time limits.
-                        out = subprocess.check_output([machine.scheduler.submission_command, '-d',
-                                                       f'afterany:{job_num}', str(job_script_multisubmission)])
-                        *rest, job_num = str(out, 'utf-8').split(' ')
-                        job_num = job_num.strip()
-                        print(f"\nSubmitted multisubmission {i+2}, job number {job_num}")
-                        jobs.append(job_num)
-
-                with open(output_dir / 'jobs.txt', 'w') as f:
-                    for job in jobs:
-                        f.write(f'{job}\n')
-
-                # Log the submission to a google sheet using logger
-                # TODO: (2019-07-15) Expand to include n_jobs and param_scan_fl
-                # TODO: (2019-07-17) api_json_filename should be specified by a config file option, as should whether
-                #  the logger runs
-                if log_fl:
-                    logger = Logger(api_json_filename=str(autospice_dir / 'client_secret.json'))
-                    logger.update_log({
+                    # Start the submission without waiting for it so that the next scan point can be prepared
+                    # meanwhile
+                    submission = start_submission(machine, job_script, cwd=executable_dir)
+                    pending_submissions.append(((submission, job_script_multisubmission, output_dir),
+                                                (job_name, input_file)))
+
+                    # Limit the number of submission commands running at once
+                    if len(pending_submissions) > MAX_PENDING_SUBMISSIONS:
+                        submission_args, log_info = pending_submissions.popleft()
+                        submitted_jobs.append((complete_submission(machine, n_jobs, *submission_args,
+                                                                   cwd=executable_dir), *log_info))
+        finally:
+            if executor is not None:
+                # Stop preparing scan points that haven't been started yet if the run has failed part way
+                for prepared_future in prepared_futures:
+                    prepared_future.cancel()
+                executor.shutdown()
+
+            # See every submission that was started through, even if the run has failed part way, so that no job is
+            # left in the queue without its multi-submission jobs or jobs.txt. No new submissions are started.
+            failed_submissions = complete_pending_submissions(machine, n_jobs, pending_submissions, submitted_jobs,
+                                                              cwd=executable_dir)
+
+            # Log the submissions to a google sheet using logger, all in one request once every job has been
+            # submitted. This includes the jobs which went out before any failure.
+            # TODO: (2019-07-15) Expand to include n_jobs and param_scan_fl
+            # TODO: (2019-07-17) api_json_filename should be specified by a config file option, as should whether
+            #  the logger runs
+            if log_fl and submitted_jobs:
+                # Imported here as the google API libraries are slow to import and only needed when logging
+                from logger import Logger
+                logger = Logger(api_json_filename=str(autospice_dir / 'client_secret.json'))
+                logger.update_log_batch([
+                    {
                         'machine': machine_name,
                         'job_number': jobs[0],
-                        'job_name': submission_params['job_name'],
+                        'job_name': job_name,
                         'input_file': str(input_file),
                         'masala_config': str(config_file),
                         'nodes': submission_params['nodes'],
@@ -405,12 +465,198 @@ def submit_job(config_file, dryrun_fl=False, semi_dryrun_fl=False, safe_job_time
                         'memory_req': submission_params['memory'] if 'memory' in submission_params else 'N/A',
                         'wtime_req': submission_params['walltime'],
                         'notes': ''
-                    })
+                    }
+                    for jobs, job_name, input_file in submitted_jobs
+                ])
+
+        if failed_submissions:
+            raise failed_submissions[0]
+
     else:
         if not dryrun_fl and not restart_fl:
             shutil.rmtree(output_dir)
 
 
+def get_code_class(code_name):
+    """
+    Imports and returns the SimulationCode class for one of SUPPORTED_CODES.
+    Importing the codes only as they are needed means running autospice with
+    e.g. --help doesn't pay for the import of every code's dependencies.
+
+    :param code_name:   (str) name of the code, a key of SUPPORTED_CODES
+    :return:            SimulationCode subclass implementing the code
+
+    """
+    module_name, class_name = SUPPORTED_CODES[code_name]
+    try:
+        module = importlib.import_module(module_name)
+    except ImportError as e:
+        raise ImportError(f"Couldn't import the {code_name} module, you may need to install its dependencies "
+                          f"(e.g. flopter for spice). \n{e}") from e
+    return getattr(module, class_name)
+
+
+def get_input_template(inp_parser, scan_params):
+    """
+    Serialises the input file parser once, with each scanning parameter's value
+    replaced by a unique placeholder. Input files for each point of a parameter
+    scan can then be produced by substituting values for the placeholders in
+    the template rather than re-serialising the whole parser every time. The
+    parser's original values are restored afterwards.
+
+    The template is returned pre-split around the placeholders, so that filling
+    it in (see fill_input_template) is a single join with no searching. Even
+    indices of the returned list hold the literal text between placeholders and
+    odd indices hold the index of the scanning parameter in that position.
+
+    :param inp_parser:      Input file parser returned by the simulation code's
+                            get_scanning_parameters() method
+    :param scan_params:     (list) scanning parameter dictionaries, as returned
+                            by get_scanning_parameters()
+    :return:                (list) serialised input file, split at the
+                            placeholders
+
+    """
+    original_values = [inp_parser[sp['section']][sp['parameter']] for sp in scan_params]
+    for k, sp in enumerate(scan_params):
+        inp_parser[sp['section']][sp['parameter']] = SCAN_PLACEHOLDER.format(k)
+
+    buffer = io.StringIO()
+    inp_parser.write(buffer)
+
+    for sp, value in zip(scan_params, original_values):
+        inp_parser[sp['section']][sp['parameter']] = value
+
+    template = SCAN_PLACEHOLDER_RE.split(buffer.getvalue())
+    template[1::2] = [int(k) for k in template[1::2]]
+    return template
+
+
+def fill_input_template(template, param_values):
+    input_text = list(template)
+    input_text[1::2] = [str(param_values[k]) for k in template[1::2]]
+    return ''.join(input_text)
+
+
+def get_header_template(machine, submission_params):
+    """
+    Produces the job script header once, with placeholders in place of the
+    submission parameters which change between the points of a parameter scan
+    (see SCAN_VARYING_SUBMISSION_PARAMS). Each scan point's header can then be
+    made with fill_header_template() instead of being rendered from scratch.
+
+    :param machine:             Machine object whose scheduler writes the header
+    :param submission_params:   (dict) submission parameters shared by all scan
+                                points
+    :return:                    (str) job script header template
+
+    """
+    template_params = dict(submission_params)
+    for param in SCAN_VARYING_SUBMISSION_PARAMS:
+        template_params[param] = HEADER_PLACEHOLDER.format(param)
+    return machine.scheduler.get_submission_script_header(template_params)
+
+
+def fill_header_template(template, submission_params):
+    return HEADER_PLACEHOLDER_RE.sub(lambda match: str(submission_params[match.group(1)]), template)
+
+
+def start_submission(machine, job_script, dependency=None, cwd=None, array=None):
+    """
+    Starts the submission of a job script to the machine's scheduler without
+    waiting for it to complete. Pass the returned process to
+    wait_for_submission() to get the job number.
+
+    :param machine:     Machine object whose scheduler the job is submitted to
+    :param job_script:  (path-like) job script to submit
+    :param dependency:  (str) Optional job number which must finish before this
+                        job can start
+    :param cwd:         (path-like) Optional directory to submit the job from
+    :param array:       (str) Optional slurm job array specification, e.g.
+                        '1-4%1', to submit the script as a job array
+    :return:            (subprocess.Popen) the running submission command
+
+    """
+    command = [machine.scheduler.submission_command]
+    if dependency is not None:
+        command.extend(['-d', f'afterany:{dependency}'])
+    if array is not None:
+        command.append(f'--array={array}')
+    command.append(str(job_script))
+    return subprocess.Popen(command, stdout=subprocess.PIPE, cwd=cwd)
+
+
+def wait_for_submission(machine, submission):
+    out, _ = submission.communicate()
+    if submission.returncode != 0:
+        raise subprocess.CalledProcessError(submission.returncode, submission.args, output=out)
+    return machine.scheduler.get_job_number(out)
+
+
+def complete_submission(machine, n_jobs, submission, job_script_multisubmission, output_dir, cwd=None):
+    """
+    Waits for a job submission started by start_submission() and, if the
+    requested walltime needs several jobs, submits the remaining jobs as a
+    chain of dependent multi-submission jobs. On slurm the chain is a single
+    job array, run one task at a time. The job numbers are written to jobs.txt
+    in the output directory.
+
+    :return:    (list) job numbers of all submitted jobs
+
+    """
+    job_num = wait_for_submission(machine, submission)
+    print(f"\nSubmitted job number {job_num}")
+
+    jobs = [job_num, ]
+    if n_jobs > 1 and machine.scheduler.name.lower() == 'slurm':
+        # Submit all of the remaining jobs at once as a job array which only runs one task at a time, and only once
+        # the first job has finished.
+        array_job_num = wait_for_submission(machine, start_submission(machine, job_script_multisubmission,
+                                                                      dependency=job_num, cwd=cwd,
+                                                                      array=f'1-{n_jobs - 1}%1'))
+        print(f"\nSubmitted multisubmissions 2-{n_jobs} as job array {array_job_num}")
+        jobs.append(array_job_num)
+    elif n_jobs > 1:
+        for i in range(n_jobs - 1):
+            # TODO: (2019-10-10) This is only applicable to slurm, other implementations possible but this
+            # TODO: is only currently necessary because of marconi's time limits.
+            job_num = wait_for_submission(machine, start_submission(machine, job_script_multisubmission,
+                                                                    dependency=job_num, cwd=cwd))
+            print(f"\nSubmitted multisubmission {i+2}, job number {job_num}")
+            jobs.append(job_num)
+
+    (output_dir / 'jobs.txt').write_text('\n'.join(jobs) + '\n')
+
+    return jobs
+
+
+def complete_pending_submissions(machine, n_jobs, pending_submissions, submitted_jobs, cwd=None):
+    """
+    Completes each of the submissions started by start_submission() that are
+    still pending, carrying on past any that fail so that all of the jobs which
+    did reach the queue get their multi-submission jobs and jobs.txt.
+
+    :param pending_submissions: (deque) of (complete_submission() arguments,
+                                logging information) tuples, emptied by this
+                                function
+    :param submitted_jobs:      (list) to which a (job numbers, *logging
+                                information) tuple is appended for each
+                                successful submission
+    :return:                    (list) the exceptions raised by any submissions
+                                which failed
+
+    """
+    failed_submissions = []
+    while pending_submissions:
+        submission_args, log_info = pending_submissions.popleft()
+        try:
+            submitted_jobs.append((complete_submission(machine, n_jobs, *submission_args, cwd=cwd), *log_info))
+        except Exception as e:
+            print(f"\nSubmission of {log_info[0]} failed: {e}")
+            failed_submissions.append(e)
+    return failed_submissions
+
+
 def process_scheduler_options(machine, scheduler_opts, safe_job_time_fl=True):
     """
     Function for parsing teh config file and verifying the scheduler options for
@@ -425,8 +671,8 @@ def process_scheduler_options(machine, scheduler_opts, safe_job_time_fl=True):
                                 supercomputer being submitted to and the
                                 scheduler it uses.
     :param scheduler_opts:      (section/dict) The section titled 'scheduler'
-                                from the yaml config file, usually a Section
-                                from configparser.
+                                from the yaml config file, usually a
+                                ConfigSection from fast_ini_parse.
     :param safe_job_time_fl:    (boolean) Controls whether a 'safe' time is used
                                 for walltime (90% of maximum allowed on machine)
                                 to allow time for I/O to occur before job is
@@ -438,51 +684,59 @@ def process_scheduler_options(machine, scheduler_opts, safe_job_time_fl=True):
 
     """
     job_name = scheduler_opts['job_name']
+    machine_label = machine.name
+    max_job_time = machine.max_job_time
+    memory_per_node = machine.memory_per_node
+    scheduler = machine.scheduler
 
     # Check if number of processors is sensible for this machine
     n_cpus = scheduler_opts['n_cpus']
-    try:
-        n_cpus = int(n_cpus)
-    except:
+    if not n_cpus.isdigit():
         raise TypeError("Can't use a non-integer number of CPUs")
+    n_cpus = int(n_cpus)
 
-    isolate_first_node_fl = 'isolate_first_node' in scheduler_opts and scheduler_opts.getboolean('isolate_first_node')
-    if 'nodes' not in scheduler_opts:
+    sched_get = scheduler_opts.get
+    isolate_first_node = sched_get('isolate_first_node')
+    isolate_first_node_fl = isolate_first_node is not None and as_bool(isolate_first_node)
+    nodes = sched_get('nodes')
+    if nodes is None:
         nodes, cpus_per_node = machine.calc_nodes(n_cpus)
     else:
-        try:
-            nodes = int(scheduler_opts['nodes'])
-        except:
-            raise TypeError("Can't use a non-integer number of CPUs")
+        if not nodes.isdigit():
+            raise TypeError("Can't use a non-integer number of nodes")
+        nodes = int(nodes)
         cpus_per_node = machine.check_nodes(n_cpus, nodes, allow_remainder_fl=isolate_first_node_fl)
 
-    # TODO: verify string is in correct format
     walltime = scheduler_opts['walltime']
+    parse_walltime(walltime)
     n_jobs = machine.get_n_jobs(walltime, safe_job_time_fl=safe_job_time_fl)
     if n_jobs > 1 and not safe_job_time_fl:
         print(f"Walltime requested ({walltime}) exceeds the maximum available walltime for a single job on \n"
-              f"{machine.name} - which is {machine.max_job_time}hrs. The job will be split into {n_jobs} to complete \n"
+              f"{machine_label} - which is {max_job_time}hrs. The job will be split into {n_jobs} to complete \n"
               f"successfully.")
-        walltime = f"{machine.max_job_time}:00:00"
+        walltime = f"{max_job_time}:00:00"
     elif n_jobs > 1:
         safe_job_time = machine.get_safe_job_time()
         print(f"Walltime requested ({walltime}) exceeds the maximum available safe walltime for a single job on \n"
-              f"{machine.name} - which is {safe_job_time}hrs. The job will be split into {n_jobs} to complete \n"
-              f"successfully, but the requested time will remain {machine.max_job_time}:00:00 per job. \n")
-        walltime = f"{machine.max_job_time}:00:00"
+              f"{machine_label} - which is {safe_job_time}hrs. The job will be split into {n_jobs} to complete \n"
+              f"successfully, but the requested time will remain {max_job_time}:00:00 per job. \n")
+        walltime = f"{max_job_time}:00:00"
 
-    optional_submission_params = machine.scheduler.get_optional_submission_params(scheduler_opts)
+    optional_submission_params = scheduler.get_optional_submission_params(scheduler_opts)
 
     # Memory is a special case as it is optional by default but must be verified and possibly recalculated if given.
-    if 'memory' in scheduler_opts:
-        memory_req = int(scheduler_opts['memory'])
-        if memory_req > machine.memory_per_node * nodes:
+    memory_req = sched_get('memory')
+    if memory_req is not None:
+        if not memory_req.isdigit():
+            raise TypeError("Can't use a non-integer amount of memory")
+        memory_req = int(memory_req)
+        if memory_req > memory_per_node * nodes:
             # TODO: Memory should be able to be prioritised above maximising cpus_per_node
-            print(f"WARNING: Requested amount of memory exceeds the maximum available on {machine.name}. With {nodes}\n"
-                  f"node(s) the maximum amount of available memory is {machine.memory_per_node * nodes}GB, the job \n"
+            print(f"WARNING: Requested amount of memory exceeds the maximum available on {machine_label}. With \n"
+                  f"{nodes} node(s) the maximum amount of available memory is {memory_per_node * nodes}GB, the job \n"
                   f"will be submitted with this amount requested. To submit the job with {memory_req}GB of memory, \n"
-                  f"you would require {int(math.ceil(memory_req / machine.memory_per_node))} nodes.\n")
-            memory_req = machine.memory_per_node * nodes
+                  f"you would require {int(math.ceil(memory_req / memory_per_node))} nodes.\n")
+            memory_req = memory_per_node * nodes
         optional_submission_params['memory'] = memory_req
 
     # Parameters needed for batch submission
@@ -495,7 +749,7 @@ def process_scheduler_options(machine, scheduler_opts, safe_job_time_fl=True):
     }
 
     if 'email' in submission_params and 'email_events' not in submission_params:
-        submission_params['email_events'] = machine.scheduler.default_email_settings
+        submission_params['email_events'] = scheduler.default_email_settings
 
     # Parameters needed for writing the script that calls the simulation code
     call_params = {
@@ -503,7 +757,7 @@ def process_scheduler_options(machine, scheduler_opts, safe_job_time_fl=True):
     }
 
     if isolate_first_node_fl:
-        if machine.scheduler.name.lower() != 'slurm':
+        if scheduler.name.lower() != 'slurm':
             raise NotImplementedError('First node isolation has only been implemented for slurm at this time.')
         min_cpus, max_cpus = machine.get_isolated_node_distribution(n_cpus, nodes)
         print(
@@ -511,13 +765,12 @@ def process_scheduler_options(machine, scheduler_opts, safe_job_time_fl=True):
             f'to better utilise memory. The number of nodes requested will still be used, but the tasks-per-node \n'
             f'option will be overridden.'
         )
-        call_params['node_dist_string'] = f'1,{",".join([str(min_cpus) for _ in range(nodes - 2)])},{max_cpus}'
+        call_params['node_dist_string'] = f'1,{f"{min_cpus}," * (nodes - 2)}{max_cpus}'
 
-    ignored_params = (set(scheduler_opts.keys()) - set(submission_params.keys()) - {'n_cpus', 'machine', 'user', }
-                      - {'isolate_first_node'})
+    ignored_params = scheduler_opts.keys() - submission_params.keys() - UNIVERSAL_SCHEDULER_OPTIONS
     if len(ignored_params) > 0:
         print(f'WARNING: The following parameters have not been implemented for the scheduler \n'
-              f'({machine.scheduler.name}) on {machine.name}: \n'
+              f'({scheduler.name}) on {machine_label}: \n'
               f'{ignored_params} \n\n'
               f'These will therefore be ignored on this run.')
 
@@ -525,45 +778,45 @@ def process_scheduler_options(machine, scheduler_opts, safe_job_time_fl=True):
 
 
 def print_choices(submission_params, call_params, code_name, machine_name):
-    full_input = call_params['executable_dir'] / call_params['input_file']
-    full_output = call_params['executable_dir'] / call_params['output_dir']
-    full_exe = call_params['executable_dir'] / call_params['executable']
-
-    print("\nChosen options for simulation run are:")
-    options = OrderedDict([
-        ('Run name', submission_params['job_name']),
-        ('Machine', machine_name),
-        ('Code', code_name),
-        ('Input file path', str(full_input)),
-        ('Output directory', str(full_output)),
-        ('Executable file path', str(full_exe)),
-        ('Walltime', submission_params['walltime'])
-    ])
+    # The input, output and executable paths are already absolute, having been joined onto executable_dir once in
+    # submit_job
+
+    options = {
+        'Run name': submission_params['job_name'],
+        'Machine': machine_name,
+        'Code': code_name,
+        'Input file path': call_params['input_file'],
+        'Output directory': call_params['output_dir'],
+        'Executable file path': call_params['executable'],
+        'Walltime': submission_params['walltime']
+    }
     if 'queue' in submission_params:
-        options.update({'Queue': submission_params['queue']})
+        options['Queue'] = submission_params['queue']
     if 'account' in submission_params:
-        options.update({'Account': submission_params['account']})
+        options['Account'] = submission_params['account']
     if 'node_dist_string' in call_params:
-        options.update({'Node-task distribution': call_params['node_dist_string']})
+        options['Node-task distribution'] = call_params['node_dist_string']
 
-    pprint(options)
+    print("\nChosen options for simulation run are:")
+    print('\n'.join(f'  {label:25s}: {value}' for label, value in options.items()))
     print(f"\nWill use {call_params['cpus_tot']} cpus across {submission_params['nodes']} nodes")
 
-    hrs, min, sec = (int(quantity) for quantity in submission_params['walltime'].split(':'))
-    total_walltime = timedelta(hours=hrs, minutes=min, seconds=sec) * call_params['cpus_tot']
-    print(f"Total CPU time requested is {format_timespan(total_walltime)}\n")
+    hrs, min, sec = parse_walltime(submission_params['walltime'])
+    total_cpu_seconds = (hrs * 3600 + min * 60 + sec) * call_params['cpus_tot']
+    print(f"Total CPU time requested is {format_timespan(total_cpu_seconds)}\n")
 
 
 def write_job_script(submission_params, machine, code, call_params, multi_submission=False, label='', dryrun_fl=False,
-                     safe_job_time_fl=True, backup_fl=True):
-    header = machine.scheduler.get_submission_script_header(submission_params)
-    modules = machine.get_submission_script_modules()
+                     safe_job_time_fl=True, backup_fl=True, modules=None, header=None):
+    if header is None:
+        header = machine.scheduler.get_submission_script_header(submission_params)
+    if modules is None:
+        modules = machine.get_submission_script_modules()
     body = code.get_submission_script_body(machine, call_params, multi_submission=multi_submission,
                                            safe_job_time_fl=safe_job_time_fl, backup_fl=backup_fl)
 
     if not dryrun_fl:
         job_script = Path(str(call_params['output_dir'] / f'melange{label}') + machine.scheduler.script_ext)
-        job_script.touch()
         job_script.write_text(header + modules + body)
     else:
         job_script = header + modules + body
@@ -2,7 +2,7 @@ import abc
 import shutil
 import datetime
 from pathlib import Path
-from utils import find_next_available_dir
+from utils import find_next_available_dir, parallel_copytree
 
 
 class SimulationCode(abc.ABC):
@@ -10,52 +10,61 @@ class SimulationCode(abc.ABC):
     Abstract base class for storing code specific options and any necessary
     verification methods
     """
-    SUBCLASS_COUNT = 0
     LOG_PREFIX = 'log'
 
     EXE_COPY_SUBFOLDER = 'localbin'
     EXE_FILES_TO_COPY = tuple()
     EXE_FOLDERS_TO_COPY = tuple()
 
-    def __init__(self, name, mandatory_config_labels, optional_config_labels=None, boolean_config_labels=None):
+    MANDATORY_CONFIG_LABELS = tuple()
+    OPTIONAL_CONFIG_LABELS = tuple()
+    BOOLEAN_CONFIG_LABELS = tuple()
+
+    def __init__(self, name, mandatory_config_labels=None, optional_config_labels=None, boolean_config_labels=None):
+        # Config labels default to the constants defined on the subclass
+        if mandatory_config_labels is None:
+            mandatory_config_labels = self.MANDATORY_CONFIG_LABELS
+        if optional_config_labels is None:
+            optional_config_labels = self.OPTIONAL_CONFIG_LABELS
+        if boolean_config_labels is None:
+            boolean_config_labels = self.BOOLEAN_CONFIG_LABELS
+
         self.name = name
         self.mandatory_config_labels = mandatory_config_labels
 
-        if optional_config_labels is not None:
-            self.optional_config_labels = set(optional_config_labels)
-        else:
-            self.optional_config_labels = set()
-
-        self.all_config_labels = set(self.mandatory_config_labels) | self.optional_config_labels
+        # Label sets are built once here and reused on every call to process_config_options
+        self.mandatory_label_set = frozenset(mandatory_config_labels)
+        self.optional_config_labels = frozenset(optional_config_labels)
+        self.all_config_labels = self.mandatory_label_set | self.optional_config_labels
 
-        if boolean_config_labels and self.all_config_labels.issuperset(set(boolean_config_labels)):
+        if boolean_config_labels and self.all_config_labels.issuperset(boolean_config_labels):
             self.boolean_labels = boolean_config_labels
         else:
-            self.boolean_labels = set()
-        SimulationCode.increment_counter()
+            self.boolean_labels = frozenset()
 
     def process_config_options(self, config_opts):
-        all_config_labels = set(self.mandatory_config_labels) | self.optional_config_labels
+        opts_keys = frozenset(config_opts)
 
         # Verify that all mandatory options are present
-        if not set(self.mandatory_config_labels).issubset(config_opts.keys()):
+        missing_labels = self.mandatory_label_set - opts_keys
+        if missing_labels:
             raise ValueError('The options in the config file do not match those specified in the code\'s definition. \n'
                              f'The config file should contain all mandatory options ({self.mandatory_config_labels}) '
-                             f'under the heading "{self.name}". \nMissing params: '
-                             f'{set(self.mandatory_config_labels) - set(config_opts)}')
+                             f'under the heading "{self.name}". \nMissing params: {set(missing_labels)}')
 
         # Verify that no undefined options were added in
-        for label in config_opts:
-            if label not in all_config_labels:
-                raise ValueError(f'An interloper option ({label}) was found in the config file. \n'
-                                 f'The config file should contain only these options: '
-                                 f'{all_config_labels} under the heading "{self.name}"')
-
-        # Set strings to bools if appropriate
+        interloper_labels = opts_keys - self.all_config_labels
+        if interloper_labels:
+            label = next(label for label in config_opts if label in interloper_labels)
+            raise ValueError(f'An interloper option ({label}) was found in the config file. \n'
+                             f'The config file should contain only these options: '
+                             f'{set(self.all_config_labels)} under the heading "{self.name}"')
+
+        # Set strings to bools, so that the processed options can be read directly afterwards
         if self.boolean_labels:
             for boolean_label in self.boolean_labels:
                 try:
-                    config_opts.getboolean(boolean_label)
+                    config_opts[boolean_label] = config_opts.getboolean(boolean_label)
                 except ValueError:
                     raise ValueError(f'The boolean flag "{boolean_label}" is not set to a valid boolean value. \n'
                                      f'The current value is {config_opts[boolean_label]}.')
@@ -74,7 +83,7 @@ class SimulationCode(abc.ABC):
                   f"{output_dir} \n")
 
             if not dryrun_fl:
-                shutil.copytree(output_dir, restart_dir, ignore=shutil.ignore_patterns('*backup*'))
+                parallel_copytree(output_dir, restart_dir, ignore=shutil.ignore_patterns('*backup*'))
             return restart_dir
         elif mode in ['2', 'stay_out']:
             # Make a backup of the original directory and run from the original directory
@@ -83,7 +92,7 @@ class SimulationCode(abc.ABC):
                   f"{restart_dir} \n")
 
             if not dryrun_fl:
-                shutil.copytree(output_dir, restart_dir, ignore=shutil.ignore_patterns('*backup*'))
+                parallel_copytree(output_dir, restart_dir, ignore=shutil.ignore_patterns('*backup*'))
             return output_dir
         elif mode in ['3', 'stay_in']:
             # Make a backup of the original directory inside the original directory and run from original directory
@@ -93,21 +102,22 @@ class SimulationCode(abc.ABC):
                   f"{restart_dir} \n")
 
             if not dryrun_fl:
-                shutil.copytree(output_dir, restart_dir, ignore=shutil.ignore_patterns('*backup*'))
+                parallel_copytree(output_dir, restart_dir, ignore=shutil.ignore_patterns('*backup*'))
             return output_dir
         else:
             raise ValueError('Invalid restart copy mode selected, see documentation for proper usage.')
 
     def copy_executable(self, output_dir, call_params, dryrun_fl):
+        executable_dir = call_params['executable_dir']
         executable = Path(call_params['executable'].name)
         new_executable_dir = output_dir / self.EXE_COPY_SUBFOLDER
         if not dryrun_fl:
             new_executable_dir.mkdir(parents=True)
-            shutil.copy(executable, new_executable_dir / executable)
+            shutil.copy(executable_dir / executable, new_executable_dir / executable)
             for exe_file in self.EXE_FILES_TO_COPY:
-                shutil.copy(exe_file, new_executable_dir / exe_file)
+                shutil.copy(executable_dir / exe_file, new_executable_dir / exe_file)
             for exe_folder in self.EXE_FOLDERS_TO_COPY:
-                shutil.copytree(exe_folder, new_executable_dir / exe_folder)
+                shutil.copytree(executable_dir / exe_folder, new_executable_dir / exe_folder)
         call_params['executable'] = new_executable_dir / executable
         return call_params
 
@@ -132,9 +142,8 @@ class SimulationCode(abc.ABC):
     def is_parameter_scan(self, input_file):
         pass
 
-    @classmethod
     @abc.abstractmethod
-    def is_restart(cls, config_opts):
+    def is_restart(self, config_opts):
         pass
 
     @staticmethod
@@ -146,8 +155,4 @@ class SimulationCode(abc.ABC):
     def directory_io(self, output_dir, config_opts, dryrun_fl, restart_copy_mode=1, print_fl=True):
         pass
 
-    @classmethod
-    def increment_counter(cls):
-        cls.SUBCLASS_COUNT += 1
-
 
@@ -1,9 +1,10 @@
+import os
 import pprint as pp
 from collections import OrderedDict
 from codes.core import SimulationCode
 from flopter.spice import utils as sput
 from flopter.spice.inputparser import InputParser
-from utils import find_next_available_dir
+from utils import find_next_available_dir, stat_kind
 
 
 class Spice(SimulationCode):
@@ -23,6 +24,11 @@ class Spice(SimulationCode):
             'Restart with particle information and diagnostics'
         )
     }
+    # Restart type (an index into RESTART_MODE_FORMATS) indexed by [full_restart][soft_restart]
+    RESTART_LEVELS = (
+        (0, 1),
+        (2, 2),
+    )
     VERSION_LOG_PERCENTAGE_COLS = {
         2: '$1',
         3: '$2',
@@ -35,13 +41,49 @@ class Spice(SimulationCode):
     EXE_FOLDERS_TO_COPY = (
         'DF',
     )
+    MANDATORY_CONFIG_LABELS = (
+        'spice_version',
+        'verbose',
+        'soft_restart',
+        'full_restart',
+    )
+    OPTIONAL_CONFIG_LABELS = (
+        'time_limit',
+    )
+    BOOLEAN_CONFIG_LABELS = (
+        'verbose',
+        'soft_restart',
+        'full_restart',
+    )
+    # TODO: (2020-04-24) This should probably be read in from an external bash file as opposed to being hardcoded
+    PRECALL_TEMPLATE = (
+        'source $HOME/.bashrc\n'
+
+        '\necho "Date is: $(env TZ=GB date)"\n'
+        'echo "MPI version is: "\n'
+        'echo ""\n'
+        'mpirun --version\n'
+        'echo ""\n'
+        'echo "Changing directory to {executable_dir}"\n'
+        'cd {executable_dir}\n\n'
+
+        'if [ $(ulimit -s) != "unlimited" ]; then\n'
+        '\techo "ulimit is:"\n'
+        '\tulimit -s\n\n'
+
+        '\techo ""\n'
+        '\tulimit -s unlimited\n'
+        '\techo "new ulimit is:"\n'
+        '\tulimit -s\n'
+        '\techo ""\n'
+        'fi\n\n'
+    )
 
     def __init__(self):
-        super().__init__('spice',
-                         ('spice_version', 'verbose', 'soft_restart', 'full_restart'),
-                         optional_config_labels=('time_limit', ),
-                         boolean_config_labels=('verbose', 'soft_restart', 'full_restart'))
+        super().__init__('spice')
         self.version = None
+        self.input_parsers = {}
+        self.scanning_params = {}
 
     def process_config_options(self, config_opts):
         config_opts = super().process_config_options(config_opts)
@@ -52,7 +94,7 @@ class Spice(SimulationCode):
         if spice_version not in [2, 3]:
             raise ValueError(f'spice_version given ({spice_version}) was not valid, must be either 2 or 3.')
         self.version = spice_version
-        soft_restart, full_restart = config_opts.getboolean('soft_restart'), config_opts.getboolean('full_restart')
+        soft_restart, full_restart = config_opts['soft_restart'], config_opts['full_restart']
         if soft_restart and full_restart:
             raise ValueError('The soft and full reset flags were both set to true, please select only one if '
                              'you would like to restart a simulation. Full restart uses all available information'
@@ -92,14 +134,16 @@ class Spice(SimulationCode):
         pp.pprint(OrderedDict(option_list))
 
     def get_command_line_args(self, config_opts):
-        # Read restart mode in argument format
+        # Only add arguments which are set, reading restart mode in argument format
+        cl_args = []
         restart_arg = self.get_restart_mode(config_opts)
-        verbose_arg = '-v' if config_opts['verbose'] else None
-        time_limit = f'-l {int(config_opts["time_limit"])}' if 'time_limit' in config_opts else None
-
-        # Only return arguments which are set
-        cl_args = [restart_arg, verbose_arg, time_limit]
-        return [arg for arg in cl_args if arg is not None]
+        if restart_arg is not None:
+            cl_args.append(restart_arg)
+        if config_opts['verbose']:
+            cl_args.append('-v')
+        if 'time_limit' in config_opts:
+            cl_args.append(f'-l {int(config_opts["time_limit"])}')
+        return cl_args
 
     def get_submission_script_body(self, machine, call_params, multi_submission=False, safe_job_time_fl=True,
                                    backup_fl=True, spice_version=None):
@@ -118,36 +162,15 @@ class Spice(SimulationCode):
                 spice_version = 2
         version_log_percent_col = self.VERSION_LOG_PERCENTAGE_COLS[spice_version]
 
-        # TODO: (2020-04-24) This should probably be read in from an external bash file as opposed to being hardcoded
-        precall_str = (
-            'source $HOME/.bashrc\n'
-
-            '\necho "Date is: $(env TZ=GB date)"\n'
-            'echo "MPI version is: "\n'
-            'echo ""\n'
-            'mpirun --version\n'
-            'echo ""\n'
-            f'echo "Changing directory to {executable_dir}"\n'
-            f'cd {executable_dir}\n\n'
-
-            'if [ $(ulimit -s) != "unlimited" ]; then\n'
-            '\techo "ulimit is:"\n'
-            '\tulimit -s\n\n'
-
-            '\techo ""\n'
-            '\tulimit -s unlimited\n'
-            '\techo "new ulimit is:"\n'
-            '\tulimit -s\n'
-            '\techo ""\n'
-            'fi\n\n'
-        )
+        # The script is built up as a list of fragments and joined once at the end
+        script_parts = [self.PRECALL_TEMPLATE.format(executable_dir=executable_dir)]
 
         job_name = output_dir.name
         t_file = output_dir / f't-{job_name}'
         o_file = output_dir / f'{job_name}'
 
         config_file_args = self.get_command_line_args(config_opts)
-        if multi_submission and not Spice.is_restart(config_opts):
+        if multi_submission and not self.is_restart(config_opts):
             config_file_args.append('-c')
 
         if 'time_limit' not in config_opts and machine.max_job_time is not None and safe_job_time_fl:
@@ -162,16 +185,11 @@ class Spice(SimulationCode):
                 '-w', f'`{executable_dir / "arbitrary.pl"} {call_params["node_dist_string"]}`',
             ])
         else:
-            run_command = ' '.join(['mpirun', '-np', str(cpus_tot)])
-        spice_command = ' '.join([
-            str(executable_dir / executable),
-            *config_file_args,
-            '-o', str(o_file),
-            '-i', str(input_file),
-            '-t', str(t_file)
-        ])
-
-        call_str = (
+            run_command = f'mpirun -np {cpus_tot}'
+        spice_args = ''.join(f'{arg} ' for arg in config_file_args)
+        spice_command = f'{executable_dir / executable} {spice_args}-o {o_file} -i {input_file} -t {t_file}'
+
+        script_parts.append(
             'echo ""\n'
             f'echo "executing: {run_command} {spice_command}"\n'
             'echo ""\n'
@@ -179,22 +197,17 @@ class Spice(SimulationCode):
         )
 
         if spice_version == 3:
-            stitcher_command = ' '.join([
-                str(executable_dir / 'stitcher.bin'),
-                '-i', str(input_file),
-                '-t', str(t_file),
-                '-n', str(cpus_tot)
-            ])
+            stitcher_command = f'{executable_dir / "stitcher.bin"} -i {input_file} -t {t_file} -n {cpus_tot}'
 
             # Append a call to stitcher if using Spice-3
-            call_str += (
+            script_parts.append(
                 'echo ""\n'
                 f'echo "executing: {stitcher_command}"\n'
                 'echo ""\n'
                 f'{stitcher_command}\n\n'
             )
 
-        postcall_str = (
+        script_parts.append(
             f'\n\nsleep 600 \n'
             f'cat {output_dir / self.LOG_PREFIX}.out >> {output_dir / self.LOG_PREFIX}.ongoing.out\n'
             f'cat {output_dir / self.LOG_PREFIX}.err >> {output_dir / self.LOG_PREFIX}.ongoing.err\n\n'
@@ -207,11 +220,11 @@ class Spice(SimulationCode):
             f"--exclude='*ongoing*' {output_dir}/* $BU_FOLDER\n"
         )
         if backup_fl:
-            postcall_str += (f"rsync -azvp --exclude='{self.EXE_COPY_SUBFOLDER}*' --exclude='backup*' " 
-                             f"{output_dir}/* $BU_FOLDER\n")
+            script_parts.append(f"rsync -azvp --exclude='{self.EXE_COPY_SUBFOLDER}*' --exclude='backup*' "
+                                f"{output_dir}/* $BU_FOLDER\n")
 
         # Cancel all subsequent jobs if it looks like the simulation has finished
-        postcall_str += (
+        script_parts.append(
             "\n"
             f"if (( $(cat {output_dir}/log.ongoing.out | grep '% ' | tail -n 1"
             f" | awk '{{print {version_log_percent_col}}}') >= 99 ))\n"
@@ -221,30 +234,50 @@ class Spice(SimulationCode):
 
         )
 
-        return precall_str + call_str + postcall_str
+        return ''.join(script_parts)
 
-    @classmethod
-    def get_restart_mode(cls, config_opts, rm_format='arg'):
+    def get_restart_type(self, config_opts):
+        """
+        Returns the restart type (0 for no restart, 1 for soft and 2 for full)
+        of the given config options, as processed by process_config_options.
+        """
+        return self.RESTART_LEVELS[config_opts['full_restart']][config_opts['soft_restart']]
+
+    def get_restart_mode(self, config_opts, rm_format='arg'):
         # Verify rm_format is a valid option
-        if rm_format not in cls.RESTART_MODE_FORMATS:
+        restart_mode_format = self.RESTART_MODE_FORMATS.get(rm_format)
+        if restart_mode_format is None:
             raise ValueError(f'The format requested ({rm_format}) is not supported')
 
         # Get printable version of restart mode
-        if config_opts.getboolean('full_restart'):
-            restart_type = 2
-        elif config_opts.getboolean('soft_restart'):
-            restart_type = 1
-        else:
-            restart_type = 0
+        return restart_mode_format[self.get_restart_type(config_opts)]
+
+    def is_restart(self, config_opts):
+        return self.get_restart_mode(config_opts, rm_format='bool')
 
-        return cls.RESTART_MODE_FORMATS[rm_format][restart_type]
+    @staticmethod
+    def get_input_file_key(input_file):
+        """
+        Returns a key identifying the current contents of an input file, made up
+        of its path, modification time and size.
+        """
+        input_stat = os.stat(input_file)
+        return os.fspath(input_file), input_stat.st_mtime_ns, input_stat.st_size
 
-    @classmethod
-    def is_restart(cls, config_opts):
-        return cls.get_restart_mode(config_opts, rm_format='bool')
+    def get_input_parser(self, input_file, key=None):
+        """
+        Returns an InputParser for the given input file. Parsers are cached by
+        path, modification time and size so that the input file is only parsed
+        once, however many times it is inspected.
+        """
+        if key is None:
+            key = self.get_input_file_key(input_file)
+        if key not in self.input_parsers:
+            self.input_parsers[key] = InputParser(input_filename=input_file)
+        return self.input_parsers[key]
 
     def verify_input_file(self, input_file, call_params, print_fl=True):
-        input_parser = InputParser(input_filename=input_file)
+        input_parser = self.get_input_parser(input_file)
 
         if print_fl:
             print('Verifying input file...')
@@ -286,12 +319,10 @@ class Spice(SimulationCode):
             print('...Input file verified successfully!\n')
 
     def is_parameter_scan(self, input_file):
-        input_parser = InputParser(input_filename=input_file, read_comments_fl=False)
-        scan_params = input_parser.get_scanning_params()
+        scan_params, _ = self.get_scanning_parameters(input_file)
         return len(scan_params) >= 1
 
-    @staticmethod
-    def get_scanning_parameters(input_file):
+    def get_scanning_parameters(self, input_file):
         """
         Method for returning information about the parameters specified to be
         scanned. Returns a list of dictionaries with four entries for each
@@ -304,12 +335,17 @@ class Spice(SimulationCode):
                             values in the list of parameters
         }
 
+        The scanning parameters are cached alongside the input parser, so the
+        input file is only searched for them once.
+
         :return:    list of dicts containing the above data for each parameter
 
         """
-        input_parser = InputParser(input_filename=input_file)
-        scan_params = input_parser.get_scanning_params()
-        return scan_params, input_parser
+        key = self.get_input_file_key(input_file)
+        input_parser = self.get_input_parser(input_file, key=key)
+        if key not in self.scanning_params:
+            self.scanning_params[key] = input_parser.get_scanning_params()
+        return self.scanning_params[key], input_parser
 
     @staticmethod
     def is_code_output_dir(directory):
@@ -319,9 +355,10 @@ class Spice(SimulationCode):
         # Directory I/O for regular and restart runs. If regular 'spice' io, create directory; if restart, backup
         # directory before starting run.
         restart_fl = self.is_restart(config_opts)
+        output_kind = stat_kind(output_dir)
         if not restart_fl:
             # If not restarting then check if the output folder exists already.
-            if output_dir.exists() and output_dir.is_dir():
+            if output_kind == 'dir':
                 if print_fl:
                     print(f"WARNING: {output_dir} already exists, searching for next available similar directory \n")
                 output_dir = find_next_available_dir(output_dir)
@@ -332,16 +369,16 @@ class Spice(SimulationCode):
             if not dryrun_fl:
                 output_dir.mkdir(parents=True)
 
-        elif output_dir.exists() and self.is_code_output_dir(output_dir):
+        elif output_kind == 'dir' and self.is_code_output_dir(output_dir):
             output_dir = self.copy_on_restart(output_dir, dryrun_fl, restart_copy_mode)
 
-        elif output_dir.exists() and output_dir.is_dir():
+        elif output_kind == 'dir':
             if print_fl:
                 print(f"WARNING: Directory {output_dir} doesn't look like a {self.name} simulation output folder.\n"
                       f"Will continue anyway.\n")
             output_dir = self.copy_on_restart(output_dir, dryrun_fl, restart_copy_mode)
 
-        elif output_dir.exists() and not output_dir.is_dir():
+        elif output_kind == 'file':
             raise ValueError(f'Desired directory ({output_dir}) is not a {self.name} directory and therefore not '
                              f'restartable.\n')
         else:
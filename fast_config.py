@@ -0,0 +1,77 @@
+"""
+Minimal, regex-based reader for autospice's INI-style config files, used in
+place of configparser. Each line is matched against two precompiled patterns,
+one for '[section]' headers and one for 'key: value' (or 'key = value')
+options, and sections are returned as plain dictionaries.
+
+Only the subset of the INI format that autospice config files use is
+supported. In particular there is no support for:
+ - multi-line (continuation) values
+ - value interpolation, e.g. '%(name)s' or '${section:name}'
+ - a DEFAULT section whose options are inherited by other sections
+ - inline comments, which are kept as part of the value
+ - options without a value
+"""
+import re
+from pathlib import Path
+
+
+SECTION_RE = re.compile(r'^\[([^\]]+)\]\s*$')
+KV_RE = re.compile(r'^\s*([^=:\s][^=:]*)\s*[=:]\s*(.*?)\s*$')
+BOOLEAN_STATES = {
+    '1': True, 'yes': True, 'true': True, 'on': True,
+    '0': False, 'no': False, 'false': False, 'off': False
+}
+
+
+class ConfigSection(dict):
+    """
+    Plain dictionary of option name -> string value for a single config file
+    section, with a getboolean() method mirroring that of a configparser
+    SectionProxy so it can be used as a drop-in replacement.
+    """
+
+    def getboolean(self, option):
+        return as_bool(self[option])
+
+
+def as_bool(value):
+    """
+    Converts a config file value to a boolean, accepting the same values as
+    configparser (e.g. 'true', 'yes', 'on', '1' and their negatives), case
+    insensitively.
+    """
+    state = BOOLEAN_STATES.get(value.lower())
+    if state is None:
+        raise ValueError(f'Not a boolean: {value}')
+    return state
+
+
+def fast_ini_parse(path):
+    """
+    Lightweight replacement for configparser for reading the simple
+    [section] / key: value config files used by autospice. Blank lines and
+    lines starting with ';' or '#' are skipped, option names are lower-cased
+    (as configparser does) and values are stored as stripped strings.
+
+    :param path:    Path to the config file
+    :return:        (dict) mapping of section name to ConfigSection
+
+    """
+    config = {}
+    section = None
+    for line in Path(path).read_text().splitlines():
+        stripped = line.strip()
+        if not stripped or stripped[0] in ';#':
+            continue
+
+        section_match = SECTION_RE.match(stripped)
+        if section_match:
+            section = config.setdefault(section_match.group(1), ConfigSection())
+            continue
+
+        kv_match = KV_RE.match(line)
+        if kv_match is None or section is None:
+            raise ValueError(f'Could not parse line in config file {path}: \n{line}')
+        section[kv_match.group(1).strip().lower()] = kv_match.group(2)
+    return config
@@ -66,8 +66,16 @@ class Logger(object):
                   f"{e}")
             self.sheet = None
 
+        # Number of rows in the sheet, fetched on first use and then kept up to date as rows are added
+        self.n_rows = None
+
+    def get_n_rows(self):
+        if self.n_rows is None:
+            self.n_rows = len(self.sheet.get_all_values())
+        return self.n_rows
+
     def update_log(self, log_data, backup_data=True, dry_run_fl=False):
-        index = len(self.sheet.get_all_values())
+        index = self.get_n_rows()
         timestamp = str(datetime.datetime.now())
 
         # Every row starts with an id and timestamp
@@ -82,6 +90,7 @@ class Logger(object):
         row.extend(list(log_data.values()))
         if self.sheet is not None and not dry_run_fl:
             self.sheet.insert_row(row, index + 1)
+            self.n_rows += 1
             print(f'Database updated successfully.')
         elif dry_run_fl:
             print(f'DRY RUN RESULT: {row}')
@@ -97,6 +106,49 @@ class Logger(object):
                 with open(backup_filename, 'wb') as fp:
                     pickle.dump(log_data, fp)
 
+    def update_log_batch(self, log_data_list, backup_data=True, dry_run_fl=False):
+        """
+        Adds several rows to the database at once, with a single append request
+        to the google sheet rather than one insert_row request per row.
+
+        :param log_data_list:   (list) of log_data dictionaries, one per row
+        :param backup_data:     (boolean) Whether to pickle the log data to file
+                                if the database can't be accessed
+        :param dry_run_fl:      (boolean) Whether to print the rows instead of
+                                updating the database
+
+        """
+        # Verify all log data conforms to stored log format before updating anything
+        if not all(self.verify_log_data(log_data) for log_data in log_data_list):
+            print('Log data malformed, cannot update database.')
+            return
+
+        index = self.get_n_rows() if self.sheet is not None else 0
+        timestamp = str(datetime.datetime.now())
+
+        # Every row starts with an id and timestamp
+        rows = [[index + i, timestamp, *log_data.values()] for i, log_data in enumerate(log_data_list)]
+
+        if self.sheet is not None and not dry_run_fl:
+            self.sheet.spreadsheet.values_append(f"'{self.sheet.title}'", {'valueInputOption': 'RAW'}, {'values': rows})
+            self.n_rows += len(rows)
+            print(f'Database updated successfully with {len(rows)} row(s).')
+        elif dry_run_fl:
+            for row in rows:
+                print(f'DRY RUN RESULT: {row}')
+        else:
+            print(f'{self.gsheet_name} could not be accessed right now, the rows '
+                  f'\n {rows} \n'
+                  f'will need to be added to the database manually. ')
+            if backup_data:
+                # Write each log_data dictionary to its own file, so each can be loaded with update_log_from_backup
+                for log_data in log_data_list:
+                    backup_filename = find_next_available_filename(p.Path(self.BACKUP_FILENAME))
+                    print(f'Also pickling this to file {backup_filename}, which can be loaded'
+                          f'and added to the database later.')
+                    with open(backup_filename, 'wb') as fp:
+                        pickle.dump(log_data, fp)
+
     def update_log_from_backup(self, backup_filename):
         if not p.Path(backup_filename).exists():
             raise ValueError('Passed filename does not exist.')
@@ -1,5 +1,6 @@
 from warnings import warn
 import scheduler as sch
+from utils import parse_walltime
 import math
 import collections
 
@@ -29,7 +30,7 @@ class Machine(object):
 
     def get_submission_script_modules(self):
         if self.modules is not None and isinstance(self.modules, collections.Iterable):
-            return '\n' + '\n'.join([f'module load {module}' for module in self.modules]) + '\n\n'
+            return '\n' + '\n'.join(f'module load {module}' for module in self.modules) + '\n\n'
         else:
             return '\n# NO MODULES REQUIRED\n\n'
 
@@ -71,7 +72,7 @@ class Machine(object):
             return 1
 
         if isinstance(requested_walltime, str):
-            hrs, mins, secs = (int(quantity) for quantity in requested_walltime.split(':'))
+            hrs, mins, secs = parse_walltime(requested_walltime)
             walltime_seconds = (hrs * 3600) + (mins * 60) + secs
         elif isinstance(requested_walltime, int):
             walltime_seconds = requested_walltime * 3600
@@ -1,5 +1,6 @@
 from abc import ABC
 import collections
+import re
 
 
 class Scheduler(ABC):
@@ -64,6 +65,8 @@ class Scheduler(ABC):
         'sh': '#!/bin/sh'
     }
     DEFAULT_JOINED_HEADER_LINES = None
+    # Matches the job number in the output of the submission command, by default its final whitespace-delimited token
+    JOB_NUMBER_RE = re.compile(rb'(\S+)\s*$')
 
     def __init__(self, name, submission_command, parameter_mappings, script_ext='.sh', script_lang='bash',
                  default_email_settings='ALL'):
@@ -79,7 +82,7 @@ class Scheduler(ABC):
 
         if not isinstance(script_ext, str):
             raise TypeError('script_ext must be of type str')
-        elif script_ext[0] is not '.':
+        elif not script_ext.startswith('.'):
             raise ValueError('script_ext must be a valid file extension, i.e. it must start with a "."')
         self.script_ext = script_ext
 
@@ -161,12 +164,28 @@ class Scheduler(ABC):
 
         return '\n'.join(param_value_list)
 
+    def get_job_number(self, submission_output):
+        """
+        Reads the job number from the (bytes) output of the submission command,
+        using the scheduler's JOB_NUMBER_RE and falling back to the final token
+        of the output if the scheduler's format isn't matched.
+
+        :param submission_output:   (bytes) output of the submission command
+        :return:                    (str) the job number
+
+        """
+        match = self.JOB_NUMBER_RE.search(submission_output) or Scheduler.JOB_NUMBER_RE.search(submission_output)
+        if match is None:
+            raise ValueError(f'Could not read a job number from the submission output: {submission_output}')
+        return match.group(1).decode('ascii')
+
 
 #############################
 #      Implementations      #
 #############################
 
 class Slurm(Scheduler):
+    JOB_NUMBER_RE = re.compile(rb'Submitted batch job (\d+)')
 
     def __init__(self):
         parameter_mappings = {
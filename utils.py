@@ -1,4 +1,131 @@
+import os
+import re
+import stat
+import shutil
+import subprocess
+from warnings import warn
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+
+WALLTIME_RE = re.compile(r'^(\d+):([0-5]?\d):([0-5]?\d)$')
+
+# Number of files copied concurrently by parallel_copytree(). Copies of simulation output are usually bound by the
+# latency of a networked filesystem rather than bandwidth, so several are kept in flight at once.
+MAX_COPY_WORKERS = 16
+
+
+def parse_walltime(walltime):
+    """
+    Parses and validates a walltime string of the form 'hh:mm:ss'.
+
+    :param walltime:    (str) walltime in the format 'hh:mm:ss'
+    :return:            (tuple) of ints (hours, minutes, seconds)
+
+    """
+    match = WALLTIME_RE.match(walltime.strip())
+    if not match:
+        raise ValueError(f'Walltime ({walltime}) is not in the correct format, it must be given as hh:mm:ss')
+    return tuple(map(int, match.groups()))
+
+
+def format_timespan(seconds):
+    """
+    Formats a number of seconds as a string of days, hours, minutes and
+    seconds, e.g. '2d 4h 30m 0s'.
+    """
+    seconds = int(seconds)
+    days, seconds = divmod(seconds, 86400)
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    return f'{days}d {hours}h {minutes}m {seconds}s'
+
+
+def stat_kind(path):
+    """
+    Determines whether a path exists and, if so, whether it is a directory or a
+    file using a single stat call, rather than the separate calls made by
+    successive Path.exists() / is_dir() / is_file() checks.
+
+    :param path:    (str or path-like) path to check
+    :return:        'dir', 'file' or None if nothing exists at the path
+
+    """
+    try:
+        st = os.stat(path)
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    return 'dir' if stat.S_ISDIR(st.st_mode) else 'file'
+
+
+def copy_to_dir(src, dst_dir):
+    """
+    Copies a file into a directory, skipping the copy (rather than raising
+    shutil.SameFileError) when the file is already in that directory.
+
+    :return:    (str) path to the file in dst_dir
+
+    """
+    dst = os.path.join(dst_dir, os.path.basename(src))
+    try:
+        if os.path.samefile(src, dst):
+            return dst
+    except FileNotFoundError:
+        pass
+    return shutil.copyfile(src, dst)
+
+
+def parallel_copytree(src, dst, ignore=None, max_workers=MAX_COPY_WORKERS):
+    """
+    Recursively copies a directory tree in the same way as shutil.copytree,
+    but with the file copies run concurrently on a thread pool. Directories
+    are created up front and their metadata is copied once all of the files
+    within them have been written.
+
+    :param src:         (path-like) Directory to copy
+    :param dst:         (path-like) Destination directory, which must not
+                        already exist
+    :param ignore:      Callable in the form of shutil.ignore_patterns(),
+                        returning the names to skip within each directory
+    :param max_workers: (int) Maximum number of files copied at once
+    :return:            (Path) the destination directory
+
+    """
+    src, dst = Path(src), Path(dst)
+    copied_dirs = []
+    # As with shutil.copytree, the copy carries on past unreadable directories and files, which are then reported
+    # together in a shutil.Error
+    errors = []
+
+    def walk_error(error):
+        errors.append((error.filename, os.fspath(dst / Path(error.filename).relative_to(src)), str(error)))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        file_copies = []
+        for dir_path, dir_names, file_names in os.walk(src, onerror=walk_error, followlinks=True):
+            ignored_names = ignore(dir_path, dir_names + file_names) if ignore is not None else set()
+            dir_names[:] = [name for name in dir_names if name not in ignored_names]
+
+            dst_dir = dst / Path(dir_path).relative_to(src)
+            dst_dir.mkdir(parents=True)
+            copied_dirs.append((dir_path, dst_dir))
+            for name in file_names:
+                if name not in ignored_names:
+                    src_file, dst_file = os.path.join(dir_path, name), dst_dir / name
+                    file_copies.append((src_file, dst_file, executor.submit(shutil.copy2, src_file, dst_file)))
+
+        for src_file, dst_file, file_copy in file_copies:
+            try:
+                file_copy.result()
+            except OSError as e:
+                errors.append((src_file, os.fspath(dst_file), str(e)))
+
+    # Copy directory metadata deepest first, as writing into a directory changes its modification time
+    for src_dir, dst_dir in reversed(copied_dirs):
+        shutil.copystat(src_dir, dst_dir)
+    if errors:
+        raise shutil.Error(errors)
+    return dst
 
 
 def find_next_available_filename(filename):
@@ -6,27 +133,49 @@ def find_next_available_filename(filename):
     return find_next_available_dir(filename).with_suffix(filename_ext)
 
 
+def get_existing_names(directory):
+    """
+    Returns the set of entry names within a directory from a single scandir
+    call, so that the existence of several siblings can be checked without a
+    stat call for each. Returns an empty set if the directory does not exist.
+    """
+    try:
+        with os.scandir(directory) as entries:
+            return {entry.name for entry in entries}
+    except (FileNotFoundError, NotADirectoryError):
+        return set()
+
+
 def find_next_available_dir(directory):
+    existing_names = get_existing_names(directory.parent)
     i = 0
-    dummy_dir = directory
-    while dummy_dir.exists():
+    dummy_name = directory.name
+    while dummy_name in existing_names:
         i += 1
-        dummy_dir = dummy_dir.parent / Path(f"{directory.stem}_{i}_")
-    return dummy_dir
-
-# TODO: This has been temporarily removed due to the git repo object not being present.
-#
-# from warnings import warn
-# import git.repository as git
-#
-# def git_check(executable_path):
-#     # Check if latest changes to executable have been committed
-#     repo = git.Repository(executable_path, search_parent_directories=True)
-#     if repo.is_dirty():
-#         warn("There are uncommitted changes to the executable code's git "
-#              "repository")
-#
-#     # TODO: Check if the executable has been compiled since the last commit
-#     # TODO: Other repos e.g. mercurial etc.?
-def full(path):
-    return str(path.resolve())
+        dummy_name = f"{directory.stem}_{i}_"
+    return directory.parent / dummy_name
+
+
+def git_check(executable_path):
+    """
+    Warns if the git repository containing the executable has uncommitted
+    changes to tracked files, using a single call to the git command line tool.
+    Untracked files, such as a freshly compiled executable, are not reported.
+    Nothing is done if git is unavailable or the executable isn't within a git
+    repository.
+
+    :param executable_path:     (path-like) Path to the executable
+
+    """
+    # Check if latest changes to executable have been committed
+    try:
+        status = subprocess.run(['git', '-C', str(Path(executable_path).parent), 'status', '--porcelain=v2',
+                                 '--untracked-files=no'],
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, universal_newlines=True)
+    except OSError:
+        return
+    if status.returncode == 0 and status.stdout.strip():
+        warn("There are uncommitted changes to the executable code's git repository")
+
+    # TODO: Check if the executable has been compiled since the last commit
+    # TODO: Other repos e.g. mercurial etc.?